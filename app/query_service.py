@@ -1,8 +1,33 @@
+import os
 import time
 from rag.retriever import Retriever
 from rag.generator import LlamaGenerator
 
 
+# Strict instructions to avoid hallucinations: the LLM must ONLY answer from
+# the given context. Kept as a fixed constant and always sent first (as the
+# system prompt) so every query shares an identical prefix, letting the
+# serving backend reuse its prefix/KV cache instead of re-processing it.
+SYSTEM_PROMPT = """Answer ONLY using the provided manual context.
+If the answer is not present, reply exactly: "I don't know."
+"""
+
+# Fixed pieces of the per-query prompt. Joining them with the context and
+# question (instead of re-rendering an f-string) keeps every byte outside
+# those two slots identical across queries, so SYSTEM_PROMPT + PREFIX is
+# always a shared, cacheable prefix.
+PREFIX = "\nContext:\n"
+MID = "\n\nQuestion: "
+SUFFIX = "\n\nAnswer:\n"
+
+# Largest retrieval distance (1 - cosine similarity) that still counts as
+# relevant. If even the best passage is farther than this, the question is
+# treated as out of scope and answered "I don't know." without calling the
+# LLM. Disabled by default (inf): set it only after checking best-passage
+# distances for in- and out-of-domain questions against your vectorstore.
+MAX_RETRIEVAL_DISTANCE = float(os.getenv("MAX_RETRIEVAL_DISTANCE", "inf"))
+
+
 class QueryService:
     """
     High-level orchestrator that connects:
@@ -22,6 +47,36 @@ class QueryService:
         self.retriever = Retriever()
         self.generator = LlamaGenerator()
 
+    def _retrieve(self, question: str):
+        """
+        Retrieve supporting passages for a question.
+
+        Returns (docs, metas, retrieval_time). docs and metas are empty when
+        nothing was found or, when MAX_RETRIEVAL_DISTANCE is set, when even
+        the closest passage is beyond it, so callers skip generation entirely.
+        """
+        t0 = time.perf_counter()
+        results = self.retriever.search(question)
+        retrieval_time = time.perf_counter() - t0
+
+        docs = results["documents"][0]
+        metas = results["metadatas"][0]
+        distances = results["distances"][0]
+
+        if docs and min(distances) > MAX_RETRIEVAL_DISTANCE:
+            return [], [], retrieval_time
+
+        return docs, metas, retrieval_time
+
+    def _build_prompt(self, question: str, docs):
+        """
+        Build the per-query part of the prompt from retrieved passages.
+        The fixed instructions are passed separately as the system prompt.
+        """
+        # Merge retrieved passages into a single context block.
+        # Keeping long context is fine — Llama handles it well.
+        return "".join((PREFIX, "\n\n".join(docs), MID, question, SUFFIX))
+
     def answer(self, question: str):
         """
         Executes the end-to-end RAG query pipeline.
@@ -34,14 +89,9 @@ class QueryService:
         """
 
         # --- 1. Retrieve supporting context ---
-        t0 = time.time()
-        results = self.retriever.search(question)
-        retrieval_time = time.time() - t0
+        docs, metas, retrieval_time = self._retrieve(question)
 
-        docs = results["documents"][0]
-        metas = results["metadatas"][0]
-
-        # If retrieval yields no passages, do not generate.
+        # If retrieval yields no relevant passages, do not generate.
         if not docs:
             return {
                 "answer": "I don't know.",
@@ -50,26 +100,10 @@ class QueryService:
                 "metadata": {}
             }
 
-        # Merge retrieved passages into a single context block.
-        # Keeping long context is fine — Llama handles it well.
-        context = "\n\n".join(docs)
-
-        # Strict prompt to avoid hallucinations.
-        # The LLM is instructed to ONLY answer from the given context.
-        prompt = f"""
-Answer ONLY using the provided manual context.
-If the answer is not present, reply exactly: "I don't know."
-
-Context:
-{context}
-
-Question: {question}
-
-Answer:
-"""
+        prompt = self._build_prompt(question, docs)
 
         # --- 2. Generate the final answer using Llama ---
-        answer, gen_time = self.generator.generate(prompt)
+        answer, gen_time = self.generator.generate(prompt, system=SYSTEM_PROMPT)
 
         # Safety check — if model returned empty output.
         if not answer.strip():
@@ -82,3 +116,48 @@ Answer:
             "generation_time": gen_time,
             "metadata": metas
         }
+
+    def answer_stream(self, question: str):
+        """
+        Streaming variant of answer() for interactive use.
+
+        Retrieval runs eagerly; "answer" in the returned dict is an iterator
+        of text fragments that drives generation as it is consumed. Once the
+        iterator is exhausted, "first_token_time" (time to first token) and
+        "generation_time" are filled in on the same dict.
+        """
+        docs, metas, retrieval_time = self._retrieve(question)
+
+        result = {
+            "answer": None,
+            "retrieval_time": retrieval_time,
+            "first_token_time": 0,
+            "generation_time": 0,
+            "metadata": metas if docs else {}
+        }
+
+        def tokens():
+            # If retrieval yields no relevant passages, do not generate.
+            if not docs:
+                yield "I don't know."
+                return
+
+            prompt = self._build_prompt(question, docs)
+
+            t0 = time.perf_counter()
+            has_text = False
+
+            for token in self.generator.stream(prompt, system=SYSTEM_PROMPT):
+                if not has_text and token.strip():
+                    has_text = True
+                    result["first_token_time"] = time.perf_counter() - t0
+                yield token
+
+            result["generation_time"] = time.perf_counter() - t0
+
+            # Safety check — if model returned empty output.
+            if not has_text:
+                yield "I don't know."
+
+        result["answer"] = tokens()
+        return result
@@ -28,13 +28,13 @@ question = st.text_input("Ask a question from the manual:")
 
 # Trigger RAG pipeline when the user presses Submit
 if st.button("Submit") and question:
-    # Visual feedback while retrieval + generation run
+    # Visual feedback while retrieval runs; generation is streamed below
     with st.spinner("Thinking..."):
-        result = qs.answer(question)
+        result = qs.answer_stream(question)
 
-    # Display final answer generated by LLM
+    # Display the answer token by token as the LLM produces it
     st.subheader("📘 Answer")
-    st.write(result["answer"])
+    st.write_stream(result["answer"])
 
     # Show metadata used by the retriever (proves metadata filtering is working)
     st.subheader("📎 Metadata Used")
@@ -43,4 +43,5 @@ if st.button("Submit") and question:
     # Display latency of retrieval and generation separately (required by task spec)
     st.subheader("⏱ Latency")
     st.write(f"Retrieval: {result['retrieval_time']:.3f}s")
+    st.write(f"First token: {result['first_token_time']:.3f}s")
     st.write(f"Generation: {result['generation_time']:.3f}s")
@@ -1,15 +1,64 @@
+import asyncio
+import json
 import os
+import pickle
 import re
-import pdfplumber
+import sys
+import numpy as np
 import chromadb
+import faiss
 import ollama
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+# Ensure project root is in Python path so package imports work when this
+# file is run directly as a script.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
 
-def extract_chapters_from_page(text):
+from ingestion.chunker import Chunks, split_pages
+from ingestion.pdf_parser import extract_pages
+
+
+# nomic-embed-text produces 768-dimensional vectors.
+EMBED_DIM = 768
+
+# Number of chunks sent to Ollama per embedding request.
+# Larger batches amortize tokenization + request overhead; tune via env var.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# Maximum number of embedding requests in flight at once.
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))
+
+# Maximum number of rows passed to a single collection.add call.
+CHROMA_ADD_BATCH_SIZE = 5000
+
+# FAISS HNSW graph settings: neighbours per node and build-time candidate list.
+FAISS_HNSW_M = 32
+FAISS_EF_CONSTRUCTION = 100
+
+# A line holding only a section number, followed by the next non-empty line
+# as the title (at least 4 characters once stripped). [^\S\n] is any
+# whitespace except the newline itself (spaces, tabs, \r, non-breaking
+# spaces), matching what str.strip() removes. The title is captured inside a
+# lookahead so a title line can itself start the next match.
+_CHAPTER_RE = re.compile(
+    r"^[^\S\n]*\d+[^\S\n]*\n(?=\s*(\S.{2,}\S)[^\S\n]*$)",
+    re.MULTILINE
+)
+
+# Placed between pages when scanning the whole document at once. The NUL
+# line is too short to be a title and is not whitespace, so no chapter match
+# can span two pages.
+_PAGE_SEP = "\n\x00\n"
+
+
+def detect_page_chapters(pages, default="UNKNOWN"):
     """
-    Extract section titles from a page by detecting the pattern used in the
-    Dell Latitude 5400 manual:
+    Assign a chapter to every page.
+
+    Chapter headers follow the two-line pattern used in the Dell Latitude
+    5400 manual:
 
         <section number>
         <section title>
@@ -18,32 +67,139 @@ def extract_chapters_from_page(text):
         1
         Set up your computer
 
-    The function scans each page for this two-line pattern and returns the
-    titles found. Only non-empty titles longer than a few characters are used.
+    The first chapter header found on a page becomes the active chapter,
+    which carries forward to following pages until a new header appears.
+    Pages before the first header get `default`.
+
+    Instead of scanning page by page, all pages are joined with a separator
+    and scanned by _CHAPTER_RE in a single pass; match offsets are mapped
+    back to pages with a binary search over the page start offsets. The
+    page separator keeps matches from spanning two pages.
     """
-    lines = [l.strip() for l in text.split("\n") if l.strip()]
-    chapters = []
+    corpus = _PAGE_SEP.join(pages)
+    page_starts = np.cumsum([0] + [len(text) + len(_PAGE_SEP) for text in pages[:-1]])
 
-    for i in range(len(lines) - 1):
-        # First line: just a number (e.g., "1", "2", "3")
-        if re.fullmatch(r"\d+", lines[i]):
-            title = lines[i + 1].strip()
-            if len(title) > 3:
-                chapters.append(title)
+    matches = list(_CHAPTER_RE.finditer(corpus))
+    match_pages = np.searchsorted(page_starts, [m.start() for m in matches], side="right") - 1
 
-    return chapters
+    # First header per page wins.
+    first_title = {}
+    for page, match in zip(match_pages.tolist(), matches):
+        if page not in first_title:
+            first_title[page] = match.group(1)
 
+    page_chapters = []
+    last_chapter = default
+
+    for page in range(len(pages)):
+        last_chapter = first_title.get(page, last_chapter)
+        page_chapters.append(last_chapter)
 
-def embed(text):
+    return page_chapters
+
+
+async def embed(client, texts):
     """
-    Generate a 768-dimensional embedding using Ollama's nomic-embed-text.
-    This must match the embedding dimension used during retrieval.
+    Generate 768-dimensional embeddings for a batch of texts using Ollama's
+    nomic-embed-text. This must match the embedding dimension used during
+    retrieval.
+
+    Returns one vector per input text, in the same order.
+    If the server rejects the batch as too large (HTTP 413), it is split in
+    half and each half is retried until it fits.
     """
-    resp = ollama.embed(
-        model="nomic-embed-text",
-        input=text
-    )
-    return resp["embeddings"][0]
+    try:
+        resp = await client.embed(
+            model="nomic-embed-text",
+            input=texts
+        )
+        return resp["embeddings"]
+    except ollama.ResponseError as e:
+        if e.status_code != 413 or len(texts) == 1:
+            raise
+        mid = len(texts) // 2
+        return await embed(client, texts[:mid]) + await embed(client, texts[mid:])
+
+
+async def embed_all(texts, batch_size=EMBED_BATCH_SIZE, concurrency=EMBED_CONCURRENCY):
+    """
+    Embed all texts in fixed-size batches with a bounded number of concurrent
+    requests, preserving input order.
+
+    Returns a float32 array of shape (len(texts), EMBED_DIM). Each batch
+    writes straight into its own row slice, so no intermediate list of
+    vectors is built.
+    """
+    client = ollama.AsyncClient()
+    sem = asyncio.Semaphore(concurrency)
+    embeddings = np.empty((len(texts), EMBED_DIM), dtype=np.float32)
+
+    async def embed_batch(start):
+        batch = texts[start:start + batch_size]
+        async with sem:
+            vectors = await embed(client, batch)
+        embeddings[start:start + len(batch)] = np.asarray(vectors, dtype=np.float32)
+
+    await asyncio.gather(*(
+        embed_batch(i) for i in range(0, len(texts), batch_size)
+    ))
+
+    return embeddings
+
+
+def save_chapter_index(embeddings, chunks, out_dir="vectorstore"):
+    """
+    Persist what the retriever needs for chapter-scoped search without going
+    through the vector DB's metadata filter:
+
+      - embeddings.npy: the normalized float32 vectors, in row (chunk id) order
+      - chapters.json: {chapter: [row, ...]} for every chapter
+
+    A single chapter holds a few hundred chunks at most, so a brute-force
+    dot product over its rows is faster than filtered HNSW traversal and
+    has no recall holes.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    np.save(os.path.join(out_dir, "embeddings.npy"), embeddings)
+
+    chapter_rows = {
+        name: np.flatnonzero(chunks.chapters == name).tolist()
+        for name in dict.fromkeys(chunks.chapters.tolist())
+    }
+
+    with open(os.path.join(out_dir, "chapters.json"), "w", encoding="utf-8") as f:
+        json.dump(chapter_rows, f)
+
+
+def build_faiss_index(embeddings, chunks, out_dir="vectorstore/faiss"):
+    """
+    Persist an in-process FAISS alternative to the Chroma collection.
+
+    Writes:
+      - index.faiss: HNSW inner-product index over the normalized vectors
+      - chunks.pkl: chunk texts plus page/chapter columns aligned with the
+        index rows
+
+    The retriever uses this when VECTOR_BACKEND=faiss, avoiding Chroma's
+    per-query Python/SQLite overhead.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    index = faiss.IndexHNSWFlat(EMBED_DIM, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = FAISS_EF_CONSTRUCTION
+    index.add(embeddings)
+    faiss.write_index(index, os.path.join(out_dir, "index.faiss"))
+
+    with open(os.path.join(out_dir, "chunks.pkl"), "wb") as f:
+        pickle.dump(
+            {
+                "documents": chunks.texts,
+                "pages": chunks.pages,
+                "chapters": chunks.chapters,
+            },
+            f
+        )
 
 
 def main():
@@ -51,8 +207,7 @@ def main():
     print("Parsing PDF...")
 
     # Extract plain text for every page
-    with pdfplumber.open(pdf_path) as pdf:
-        pages = [page.extract_text() or "" for page in pdf.pages]
+    pages = extract_pages(pdf_path)
 
     print(f"Parsed {len(pages)} pages")
 
@@ -61,18 +216,7 @@ def main():
     # -----------------------
     # We run a full scan BEFORE chunking so each page inherits its chapter.
     print("Detecting chapters...")
-    page_chapters = []
-    last_chapter = "UNKNOWN"
-
-    for text in pages:
-        detected = extract_chapters_from_page(text)
-
-        # If a chapter header appears on this page, update the active chapter
-        if detected:
-            last_chapter = detected[0]
-
-        # Carry chapter forward to all pages until a new one is detected
-        page_chapters.append(last_chapter)
+    page_chapters = detect_page_chapters(pages)
 
     # -----------------------
     # CHUNKING PASS
@@ -84,19 +228,29 @@ def main():
         chunk_overlap=150
     )
 
-    chunks = []
-    metadata = []
-    embeddings = []
+    # Chunks are kept column-wise (structure of arrays): one list of texts
+    # plus numpy columns for page numbers and chapters, rather than one
+    # metadata dict per chunk.
+    chunks = Chunks.from_page_chunks(
+        split_pages(splitter, pages),
+        range(1, len(pages) + 1),
+        page_chapters
+    )
 
-    for page_num, text in enumerate(pages, start=1):
-        chapter = page_chapters[page_num - 1]
+    print("Total chunks:", len(chunks))
 
-        for chunk in splitter.split_text(text):
-            chunks.append(chunk)
-            metadata.append({"page": page_num, "chapter": chapter})
-            embeddings.append(embed(chunk))
+    # -----------------------
+    # EMBEDDING PASS
+    # -----------------------
+    # Embedding all chunks in concurrent batches keeps the model busy instead
+    # of paying one request round-trip per chunk.
+    print("Embedding...")
+    embeddings = asyncio.run(embed_all(chunks.texts))
 
-    print("Total chunks:", len(chunks))
+    # L2-normalize once here so the index can use plain inner product:
+    # for unit vectors it ranks identically to cosine, without Chroma
+    # re-normalizing vectors on every comparison.
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
 
     # -----------------------
     # BUILD LOCAL VECTORSTORE
@@ -110,21 +264,46 @@ def main():
     except:
         pass
 
+    # HNSW parameters sized for a single manual (well under 10K vectors),
+    # pinned explicitly rather than relying on Chroma's defaults.
+    # Inner-product space assumes the vectors were normalized above.
+    # - construction_ef=100: candidate list while building the graph. Higher
+    #   values give a better graph but slower builds; at this scale 100 is
+    #   already near-exact.
+    # - M=16: neighbours per node. Larger M (e.g. 32) raises recall slightly
+    #   at the cost of build time and memory.
+    # - search_ef=64: candidate list at query time (Chroma default is 10).
+    #   Higher values improve recall for a small latency cost.
     collection = client.create_collection(
         name="rag_manual",
-        metadata={"hnsw:space": "cosine"}
+        metadata={
+            "hnsw:space": "ip",
+            "hnsw:construction_ef": 100,
+            "hnsw:M": 16,
+            "hnsw:search_ef": 64,
+        }
     )
 
     print("Adding to Chroma...")
     ids = [f"chunk_{i}" for i in range(len(chunks))]
 
-    # Insert documents, embeddings, and metadata together
-    collection.add(
-        ids=ids,
-        documents=chunks,
-        embeddings=embeddings,
-        metadatas=metadata
-    )
+    # Insert documents, embeddings, and metadata together, in large slices
+    # to keep per-call overhead low without exceeding Chroma's batch limit.
+    # Metadata dicts are only materialized per slice, right at the call.
+    for i in range(0, len(chunks), CHROMA_ADD_BATCH_SIZE):
+        j = i + CHROMA_ADD_BATCH_SIZE
+        collection.add(
+            ids=ids[i:j],
+            documents=chunks.texts[i:j],
+            embeddings=embeddings[i:j].tolist(),
+            metadatas=chunks.metadatas(i, j)
+        )
+
+    print("Building FAISS index...")
+    build_faiss_index(embeddings, chunks)
+
+    print("Saving chapter index...")
+    save_chapter_index(embeddings, chunks)
 
     print("DONE — Vectorstore built successfully.")
 
@@ -1,6 +1,65 @@
+from dataclasses import dataclass
+from itertools import chain
+
+import numpy as np
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 
+def split_pages(splitter, pages):
+    """
+    Split every page into chunks with a shared splitter. Returns one list
+    of chunks per page, in page order, so callers can attach per-page
+    metadata with Chunks.from_page_chunks.
+    """
+    return [splitter.split_text(text) for text in pages]
+
+
+@dataclass
+class Chunks:
+    """
+    Chunks stored column-wise (structure of arrays).
+
+    Row i of every field describes the same chunk:
+      - texts:    list of chunk strings
+      - pages:    int32 array of source page numbers
+      - chapters: object array of chapter names
+
+    Compared to one dict per chunk, this keeps metadata compact and allows
+    vectorized filtering, e.g. chunks.pages[chunks.chapters == "System setup"].
+    """
+
+    texts: list
+    pages: np.ndarray
+    chapters: np.ndarray
+
+    @classmethod
+    def from_page_chunks(cls, chunk_lists, page_numbers, page_chapters):
+        """
+        Build Chunks from one list of chunk strings per page. Every chunk
+        inherits the page number and chapter of its page.
+        """
+        counts = np.fromiter(map(len, chunk_lists), dtype=np.int32, count=len(chunk_lists))
+
+        return cls(
+            texts=list(chain.from_iterable(chunk_lists)),
+            pages=np.repeat(np.asarray(page_numbers, dtype=np.int32), counts),
+            chapters=np.repeat(np.asarray(page_chapters, dtype=object), counts),
+        )
+
+    def __len__(self):
+        return len(self.texts)
+
+    def metadatas(self, start=0, stop=None):
+        """
+        Per-chunk metadata dicts for rows [start, stop), for APIs (e.g.
+        Chroma) that need one dict per row.
+        """
+        return [
+            {"page": page, "chapter": chapter}
+            for page, chapter in zip(self.pages[start:stop].tolist(), self.chapters[start:stop].tolist())
+        ]
+
+
 class Chunker:
     """
     Responsible for converting parsed PDF pages into vector-friendly text chunks.
@@ -42,29 +101,14 @@ class Chunker:
                 }
 
         Returns:
-            A flat list of chunk dictionaries structured as:
-                {
-                    "text": <chunk_text>,
-                    "page": <page_number>,
-                    "chapter": <chapter_name>
-                }
+            A Chunks instance whose texts, pages and chapters are aligned
+            row by row.
 
         Each chunk is already enriched with metadata so ingestion can directly
         embed and store it in Chroma without additional processing.
         """
-        chunks = []
-
-        for page in parsed_pages:
-            text = page["text"]
-            split_chunks = self.splitter.split_text(text)
-
-            for chunk in split_chunks:
-                chunks.append(
-                    {
-                        "text": chunk,
-                        "page": page["page"],
-                        "chapter": page["chapter"],
-                    }
-                )
-
-        return chunks
+        return Chunks.from_page_chunks(
+            split_pages(self.splitter, [p["text"] for p in parsed_pages]),
+            [p["page"] for p in parsed_pages],
+            [p["chapter"] for p in parsed_pages],
+        )
@@ -1,9 +1,91 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import pymupdf
 import pdfplumber
 
 
+# Re-extract pages that PyMuPDF returns empty with pdfplumber's (slower)
+# layout analysis. Set PDF_PLUMBER_FALLBACK=0 to disable.
+PDF_PLUMBER_FALLBACK = os.getenv("PDF_PLUMBER_FALLBACK", "1") == "1"
+
+# Words whose tops lie within this many points of a line's first word are
+# placed on the same line (pdfplumber's default y_tolerance).
+LINE_Y_TOLERANCE = 3
+
+
+def page_text(page):
+    """
+    Extract a PyMuPDF page's text laid out line by line like pdfplumber.
+
+    PyMuPDF's plain "text" mode emits each table cell on its own line, which
+    breaks chapter/heading detection (a lone number line followed by a cell
+    looks like a section header, and ALL-CAPS cells look like headings).
+    Rebuilding visual lines from word boxes keeps a table row on one line:
+    words are grouped by their top coordinate, then ordered left to right.
+    """
+    words = sorted(page.get_text("words"), key=lambda w: (w[1], w[0]))
+
+    lines = []
+    line = []
+    line_top = None
+
+    for w in words:
+        if line and w[1] - line_top > LINE_Y_TOLERANCE:
+            lines.append(line)
+            line = []
+        if not line:
+            line_top = w[1]
+        line.append(w)
+
+    if line:
+        lines.append(line)
+
+    return "\n".join(
+        " ".join(w[4] for w in sorted(line, key=lambda w: w[0]))
+        for line in lines
+    )
+
+
+def extract_page_text(pdf_path, page_index):
+    """
+    Extract plain text from a single PDF page with pdfplumber.
+
+    Each call opens the PDF on its own so pages can be extracted in separate
+    worker processes (pdfplumber layout analysis is CPU-bound pure Python).
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        return pdf.pages[page_index].extract_text() or ""
+
+
+def extract_pages(pdf_path):
+    """
+    Extract plain text for every page, in page order.
+
+    PyMuPDF's C text extractor handles the bulk of the work (see page_text
+    for how lines are rebuilt). Pages where it finds no text are retried
+    with pdfplumber in a process pool, unless PDF_PLUMBER_FALLBACK is
+    disabled.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        pages = [page_text(page) for page in doc]
+
+    empty = [i for i, text in enumerate(pages) if not text.strip()]
+
+    if PDF_PLUMBER_FALLBACK and empty:
+        with ProcessPoolExecutor() as executor:
+            texts = executor.map(extract_page_text, repeat(pdf_path), empty)
+            for i, text in zip(empty, texts):
+                pages[i] = text
+
+    return pages
+
+
 class PDFParser:
     """
-    PDF parser using pdfplumber.
+    PDF parser using PyMuPDF, with pdfplumber as a fallback for pages
+    PyMuPDF returns empty.
     Handles multi-column text, accurate raw extraction,
     and robust section (chapter) detection for Dell manuals.
     """
@@ -22,6 +104,13 @@ class PDFParser:
             "GETTING HELP",
         ]
 
+        # Single case-insensitive alternation over all known sections, used as
+        # a one-pass prefilter so most lines skip the per-section loop.
+        self._known_sections_re = re.compile(
+            "|".join(re.escape(sec) for sec in self.known_sections),
+            re.IGNORECASE,
+        )
+
     def detect_heading(self, lines):
         """
         Detect heading by:
@@ -36,10 +125,13 @@ class PDFParser:
             if text.isupper() and 3 <= len(text.split()) <= 8:
                 return text
 
-            # Keyword / known header match
-            for sec in self.known_sections:
-                if sec.lower() in text.lower():
-                    return sec
+            # Keyword / known header match. When a line mentions several
+            # sections, the first one in known_sections wins.
+            if self._known_sections_re.search(text):
+                lowered = text.lower()
+                for sec in self.known_sections:
+                    if sec.lower() in lowered:
+                        return sec
 
         return None
 
@@ -52,28 +144,29 @@ class PDFParser:
         results = []
         current_chapter = "Unknown"
 
-        with pdfplumber.open(self.pdf_path) as pdf:
-            for page_no, page in enumerate(pdf.pages, start=1):
-                text = page.extract_text()
-
-                if not text:
-                    continue
-
-                lines = [l.strip() for l in text.split("\n") if l.strip()]
-                if not lines:
-                    continue
-
-                # Detect chapter heading
-                heading = self.detect_heading(lines)
-                if heading:
-                    current_chapter = heading
-
-                results.append(
-                    {
-                        "page": page_no,
-                        "chapter": current_chapter,
-                        "text": text,
-                    }
-                )
+        texts = extract_pages(self.pdf_path)
+
+        # Heading detection stays sequential because the current chapter
+        # carries forward from page to page.
+        for page_no, text in enumerate(texts, start=1):
+            if not text:
+                continue
+
+            lines = [l.strip() for l in text.split("\n") if l.strip()]
+            if not lines:
+                continue
+
+            # Detect chapter heading
+            heading = self.detect_heading(lines)
+            if heading:
+                current_chapter = heading
+
+            results.append(
+                {
+                    "page": page_no,
+                    "chapter": current_chapter,
+                    "text": text,
+                }
+            )
 
         return results
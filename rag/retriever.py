@@ -1,7 +1,129 @@
+import json
+import os
+import pickle
+import re
+from functools import lru_cache
+
 import chromadb
+import faiss
+import numpy as np
 import ollama
 
 
+# Vector search backend:
+# - "chroma": persistent Chroma collection (default).
+# - "faiss": in-process FAISS HNSW index, avoiding Chroma's per-query
+#   Python/SQLite overhead. Both are written by ingestion.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# Query-time HNSW candidate list for the FAISS backend (matches Chroma's
+# hnsw:search_ef set during ingestion).
+FAISS_EF_SEARCH = 64
+
+
+# Lowercase keywords found in questions, mapped to the chapter titles
+# actually found inside the PDF.
+CHAPTER_KEYWORDS = {
+    "set up": "Set up your computer",
+    "first time": "Set up your computer",
+
+    "recovery": "Create a USB recovery drive for Windows",
+    "usb": "Create a USB recovery drive for Windows",
+
+    "ports": "Chassis overview",
+    "keyboard": "Chassis overview",
+    "touchpad": "Chassis overview",
+
+    "system setup": "System setup",
+    "bios": "System setup",
+}
+
+# All keywords compiled into one alternation so a question is scanned once.
+# Longer keywords come first so overlapping phrases prefer the most specific.
+_KEYWORD_RE = re.compile(
+    r"\b("
+    + "|".join(re.escape(k) for k in sorted(CHAPTER_KEYWORDS, key=len, reverse=True))
+    + r")\b"
+)
+
+
+# Candidates fetched per requested result before MMR reranking.
+MMR_FETCH_FACTOR = 4
+
+# MMR trade-off: 1.0 ranks purely by relevance, 0.0 purely by diversity.
+MMR_LAMBDA = 0.7
+
+
+def mmr_select(query, candidates, k, lambda_mult=MMR_LAMBDA):
+    """
+    Pick k candidate indices using Maximal Marginal Relevance.
+
+    Each step selects the candidate that is most similar to the query while
+    least similar to anything already selected, which avoids filling the
+    context with near-duplicate chunks (e.g. overlapping splits of one page).
+
+    All similarities are computed up front on L2-normalized float32 arrays,
+    so the selection loop is just a few vectorized updates per step.
+    """
+    # Copies, so normalizing in place never touches the caller's arrays.
+    E = np.array(candidates, dtype=np.float32)
+    k = min(k, len(E))
+    if k == 0:
+        return []
+
+    E /= np.linalg.norm(E, axis=1, keepdims=True)
+    q = np.array(query, dtype=np.float32)
+    q /= np.linalg.norm(q)
+
+    sim_q = E @ q
+    sim_dd = E @ E.T
+
+    available = np.ones(len(E), dtype=bool)
+    # Highest similarity of each candidate to any already-selected one.
+    max_sim = np.full(len(E), -np.inf, dtype=np.float32)
+    selected = []
+
+    for _ in range(k):
+        if selected:
+            scores = lambda_mult * sim_q - (1 - lambda_mult) * max_sim
+        else:
+            scores = sim_q.copy()
+        scores[~available] = -np.inf
+
+        idx = int(np.argmax(scores))
+        selected.append(idx)
+        available[idx] = False
+        np.maximum(max_sim, sim_dd[idx], out=max_sim)
+
+    return selected
+
+
+@lru_cache(maxsize=1024)
+def _cached_embed(model: str, text: str):
+    """
+    Embed a query through Ollama, memoized per (model, text).
+
+    Users often resubmit the same question, and each miss costs a full
+    Ollama round-trip. The vector is stored as a tuple so the cached value
+    cannot be mutated by callers.
+    """
+    resp = ollama.embed(
+        model=model,
+        input=text
+    )
+    return tuple(resp["embeddings"][0])
+
+
+@lru_cache(maxsize=1024)
+def _cached_detect_chapter(question: str):
+    """
+    Return the chapter mapped to the first keyword found in the question,
+    or None if no keyword matches. Memoized per question string.
+    """
+    match = _KEYWORD_RE.search(question.lower())
+    return CHAPTER_KEYWORDS[match.group(1)] if match else None
+
+
 class Retriever:
     """
     Handles all retrieval logic for the RAG system.
@@ -16,10 +138,39 @@ class Retriever:
     embedding details or vector DB specifics.
     """
 
-    def __init__(self, persist_dir="vectorstore/chromadb"):
-        # Load the Chroma persistent database created during ingestion.
-        self.client = chromadb.PersistentClient(path=persist_dir)
-        self.collection = self.client.get_or_create_collection("rag_manual")
+    def __init__(
+        self,
+        persist_dir="vectorstore/chromadb",
+        faiss_dir="vectorstore/faiss",
+        index_dir="vectorstore"
+    ):
+        self.backend = VECTOR_BACKEND
+
+        # Chunk vectors (row i == chunk_i) and per-chapter row lists written
+        # by ingestion. The matrix is memory-mapped, so only the rows a query
+        # touches are paged in.
+        self.embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, "chapters.json"), encoding="utf-8") as f:
+            self.chapter_rows = {
+                chapter: np.asarray(rows, dtype=np.int64)
+                for chapter, rows in json.load(f).items()
+            }
+
+        if self.backend == "faiss":
+            # Load the FAISS index and its row-aligned documents/metadata.
+            self.index = faiss.read_index(os.path.join(faiss_dir, "index.faiss"))
+            with open(os.path.join(faiss_dir, "chunks.pkl"), "rb") as f:
+                store = pickle.load(f)
+
+            self.documents = store["documents"]
+
+            # Metadata is stored column-wise: page number and chapter per row.
+            self.pages = store["pages"]
+            self.chapters = store["chapters"]
+        else:
+            # Load the Chroma persistent database created during ingestion.
+            self.client = chromadb.PersistentClient(path=persist_dir)
+            self.collection = self.client.get_or_create_collection("rag_manual")
 
         # Embedding model must match what was used to build the vectorstore.
         self.embedding_model = "nomic-embed-text"
@@ -28,12 +179,9 @@ class Retriever:
         """
         Convert a piece of text into a vector using Ollama's embedding endpoint.
         Chroma expects embedding vectors of length 768 when using this model.
+        Repeated texts are served from an in-process LRU cache.
         """
-        resp = ollama.embed(
-            model=self.embedding_model,
-            input=text
-        )
-        return resp["embeddings"][0]
+        return list(_cached_embed(self.embedding_model, text))
 
     def detect_chapter(self, question: str):
         """
@@ -41,33 +189,14 @@ class Retriever:
 
         This improves retrieval accuracy by narrowing the search space
         when users ask section-specific questions.
-        The mapping keys use lowercase keywords extracted from the question,
-        and map them to the chapter titles actually found inside the PDF.
-        """
-        q = question.lower()
-
-        mapping = {
-            "set up": "Set up your computer",
-            "first time": "Set up your computer",
-
-            "recovery": "Create a USB recovery drive for Windows",
-            "usb": "Create a USB recovery drive for Windows",
-
-            "ports": "Chassis overview",
-            "keyboard": "Chassis overview",
-            "touchpad": "Chassis overview",
-
-            "system setup": "System setup",
-            "bios": "System setup",
-        }
-
-        # Return the first matching mapped chapter
-        for keyword, chapter in mapping.items():
-            if keyword in q:
-                return chapter
+        The mapping keys (CHAPTER_KEYWORDS) use lowercase keywords extracted
+        from the question, and map them to the chapter titles actually found
+        inside the PDF.
 
-        # If nothing matches, fallback to full vector search
-        return None
+        Returns None if nothing matches, so search falls back to a full
+        vector search.
+        """
+        return _cached_detect_chapter(question)
 
     def search(self, question: str, n_results=4):
         """
@@ -78,28 +207,127 @@ class Retriever:
         This is the core of the "Hybrid RAG" requirement:
         reducing hallucination and improving accuracy by scoping retrieval.
         """
-        q_emb = self.embed(question)
+        # The index stores unit vectors in inner-product space (see
+        # ingestion), so the query is normalized once here as well.
+        q = np.asarray(self.embed(question), dtype=np.float32)
+        q /= np.linalg.norm(q)
+
         chapter = self.detect_chapter(question)
 
+        # Over-fetch candidates (with their vectors) so MMR has room to
+        # trade a little relevance for diversity.
+        n_candidates = n_results * MMR_FETCH_FACTOR
+
         # 1. Metadata-aware search
         if chapter:
             try:
-                filtered = self.collection.query(
-                    query_embeddings=[q_emb],
-                    where={"chapter": {"$eq": chapter}},   # Chroma only supports $eq
-                    n_results=n_results
-                )
+                filtered = self._query(q, n_candidates, chapter)
 
                 # If we successfully retrieved chapter-matching context
                 if filtered["documents"][0]:
-                    return filtered
+                    return self._rerank(filtered, q, n_results)
 
             except Exception as e:
                 # If filtering fails, just proceed to fallback search
                 print("Metadata filter failed:", e)
 
         # 2. Fallback: search entire document
+        results = self._query(q, n_candidates)
+        return self._rerank(results, q, n_results)
+
+    def _query(self, q, n_results, chapter=None):
+        """
+        Run a vector search, optionally restricted to one chapter.
+        All paths return Chroma's result layout.
+        """
+        if chapter:
+            return self._query_chapter(q, n_results, chapter)
+
+        if self.backend == "faiss":
+            return self._query_faiss(q, n_results)
+
         return self.collection.query(
-            query_embeddings=[q_emb],
-            n_results=n_results
+            query_embeddings=[q.tolist()],
+            n_results=n_results,
+            include=["embeddings", "documents", "metadatas", "distances"]
         )
+
+    def _query_chapter(self, q, n_results, chapter):
+        """
+        Exact top-k search over one chapter's rows using the precomputed
+        chapter → row map, instead of the vector DB's metadata filter.
+
+        Chapters are small, so a brute-force dot product plus argpartition
+        beats filtered HNSW traversal and cannot miss matching chunks.
+        """
+        rows = self.chapter_rows.get(chapter, np.empty(0, dtype=np.int64))
+        k = min(n_results, len(rows))
+        if k == 0:
+            return self._build_result([], [])
+
+        scores = self.embeddings[rows] @ q
+
+        # Unordered top-k, then sort just those k by score.
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return self._build_result(rows[top].tolist(), scores[top].tolist())
+
+    def _query_faiss(self, q, n_results):
+        """
+        Search the whole FAISS index.
+        """
+        params = faiss.SearchParametersHNSW(efSearch=FAISS_EF_SEARCH)
+        scores, idx = self.index.search(q.reshape(1, -1), n_results, params=params)
+
+        # FAISS pads with -1 when the index holds fewer than n_results rows.
+        hits = idx[0] >= 0
+        return self._build_result(idx[0][hits].tolist(), scores[0][hits].tolist())
+
+    def _build_result(self, rows, scores):
+        """
+        Assemble a Chroma-style query result for the given chunk rows,
+        ordered best first. Scores are inner products; distances follow
+        Chroma's "ip" space convention (1 - dot product).
+        """
+        ids = [f"chunk_{row}" for row in rows]
+
+        if self.backend == "faiss":
+            documents = [self.documents[row] for row in rows]
+            metadatas = [
+                {"page": int(self.pages[row]), "chapter": self.chapters[row]}
+                for row in rows
+            ]
+        elif ids:
+            # Chroma's get() does not guarantee input order, so re-align by id.
+            got = self.collection.get(ids=ids, include=["documents", "metadatas"])
+            position = {chunk_id: i for i, chunk_id in enumerate(got["ids"])}
+            documents = [got["documents"][position[chunk_id]] for chunk_id in ids]
+            metadatas = [got["metadatas"][position[chunk_id]] for chunk_id in ids]
+        else:
+            documents, metadatas = [], []
+
+        return {
+            "ids": [ids],
+            "documents": [documents],
+            "metadatas": [metadatas],
+            "distances": [[1.0 - score for score in scores]],
+            "embeddings": [self.embeddings[rows]],
+        }
+
+    def _rerank(self, results, q, n_results):
+        """
+        Reduce a Chroma query result to n_results entries chosen by MMR.
+
+        The returned dict keeps Chroma's nested [[...]] layout so callers can
+        keep reading results["documents"][0] etc. Candidate vectors are
+        dropped once they have been used.
+        """
+        keep = mmr_select(q, results["embeddings"][0], n_results)
+
+        for key in ("ids", "documents", "metadatas", "distances"):
+            if results.get(key) is not None:
+                results[key] = [[results[key][0][i] for i in keep]]
+
+        results["embeddings"] = None
+        return results